@@ -74,6 +74,18 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+# Poll results are cached and invalidated when votes are submitted. The local-memory cache is only valid for a
+# single process: deployments running several workers need a shared backend (memcached, database, ...).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -1,6 +1,73 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count
+from django.utils.functional import cached_property
 
-from .models import Poll, Choice
+from .models import Poll, Choice, Vote
+
+
+""" Row count above which the admin changelists trust the database estimate instead of running COUNT(*) """
+ESTIMATED_COUNT_MIN = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the table statistics kept by the database to count unfiltered querysets. Filtered querysets,
+    small tables and backends without statistics fall back to the exact count.
+    """
+    @cached_property
+    def count(self):
+        """
+        :return: estimated number of objects for unfiltered large tables, exact number otherwise
+        """
+        if not self.object_list.query.where:
+            estimate = self.get_estimate()
+            if estimate >= ESTIMATED_COUNT_MIN:
+                return estimate
+        return self.object_list.count()
+
+    def get_estimate(self):
+        """
+        :return: row count estimated by the database for the queryset table, 0 if the backend has no estimate
+        """
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+
+        if connection.vendor == 'postgresql':
+            sql = 'SELECT reltuples FROM pg_class WHERE relname = %s'
+        elif connection.vendor == 'mysql':
+            sql = 'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s'
+        else:
+            return 0
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] else 0
+
+
+class PollChangeList(ChangeList):
+    """
+    Changelist for :model:`polls.Poll` adding the :model:`polls.Vote` total of the polls in the current page only.
+    """
+    def get_results(self, request):
+        """
+        Paginate the polls and then count the votes of the page in a single grouped query.
+
+        :param request: HTTP request
+        """
+        super(PollChangeList, self).get_results(request)
+        polls = list(self.result_list)
+        totals = dict(Vote.objects.filter(choice__poll__in=[p.pk for p in polls]
+            ).order_by(
+            ).values_list('choice__poll'
+            ).annotate(total_votes=Count('pk')))
+        for poll in polls:
+            poll.total_votes = totals.get(poll.pk, 0)
+        self.result_list = polls
 
 
 class ChoiceInline(admin.TabularInline):
@@ -9,6 +76,21 @@ class ChoiceInline(admin.TabularInline):
     """
     model = Choice
     extra = 2
+    fields = ('text', 'total_votes')
+    readonly_fields = ('total_votes',)
+
+    def get_queryset(self, request):
+        """
+        :return: query set with the :model:`polls.Vote` total of each choice annotated in a single grouped query
+        """
+        return super(ChoiceInline, self).get_queryset(request).annotate(total_votes=Count('vote'))
+
+    def total_votes(self, obj):
+        """
+        :return: annotated vote total for the given :model:`polls.Choice`, 0 for unsaved choices
+        """
+        return getattr(obj, 'total_votes', 0)
+    total_votes.short_description = 'votes'
 
 
 class PollAdmin(admin.ModelAdmin):
@@ -17,13 +99,62 @@ class PollAdmin(admin.ModelAdmin):
     """
     fieldsets = [
         ('General',     {'fields': ['title', 'location', 'description', 'pub_date', 'author']}),
-        ('Settings',    {'fields': ['hidden_poll', 'single_vote', 'limit_votes', 'votes_max']}),
+        ('Settings',    {'fields': ['hidden_poll', 'single_vote', 'limit_votes', 'votes_max', 'ranked']}),
         ('Sharing',     {'fields': ['only_invited']}),
     ]
     inlines = [ChoiceInline]
-    list_display = ('title', 'pub_date', 'author')
+    list_display = ('title', 'pub_date', 'author', 'total_votes')
     list_filter = ['pub_date']
+    list_select_related = ('author',)
+    raw_id_fields = ('author',)
     search_fields = ['title']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        """
+        :return: the changelist class counting the votes of the listed polls
+        """
+        return PollChangeList
+
+    def total_votes(self, obj):
+        """
+        :return: vote total for the given :model:`polls.Poll`, as counted by :class:`PollChangeList`
+        """
+        return obj.total_votes
+    total_votes.short_description = 'votes'
+
+
+class VoteAdmin(admin.ModelAdmin):
+    """
+    Read-only admin for :model:`polls.Vote`.
+    """
+    fields = ('choice', 'user')
+    readonly_fields = ('choice', 'user')
+    list_display = ('id', 'poll', 'choice', 'user')
+    list_filter = ['choice__poll__pub_date']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        """
+        :return: query set joining the related :model:`polls.Choice`, :model:`polls.Poll` and :model:`auth.User`
+        """
+        return super(VoteAdmin, self).get_queryset(request).select_related('choice__poll', 'user')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def poll(self, obj):
+        """
+        :return: the :model:`polls.Poll` the given :model:`polls.Vote` belongs to
+        """
+        return obj.choice.poll
+    poll.admin_order_field = 'choice__poll'
 
 
 admin.site.register(Poll, PollAdmin)
+admin.site.register(Vote, VoteAdmin)
@@ -0,0 +1,122 @@
+import numpy as np
+
+
+def vote_matrix(votes, choices):
+    """
+    Build the compact voters x choices matrix of a :model:`polls.Poll`.
+
+    :param votes: sequence of (user_pk, choice_pk) pairs
+    :param choices: sorted sequence of the :model:`polls.Choice` primary-keys, one column each
+    :return: boolean matrix with a row for each :model:`auth.User` that voted, True where the user voted the choice
+    """
+    votes = np.asarray(votes, dtype=np.int64).reshape(-1, 2)
+    users, rows = np.unique(votes[:, 0], return_inverse=True)
+    columns = np.searchsorted(np.asarray(choices, dtype=np.int64), votes[:, 1])
+
+    matrix = np.zeros((len(users), len(choices)), dtype=bool)
+    matrix[rows, columns] = True
+    return matrix
+
+
+def cooccurrence(matrix):
+    """
+    Count, for each pair of choices, the voters that voted both of them.
+
+    :param matrix: boolean voters x choices matrix as returned by :func:`vote_matrix`
+    :return: symmetric choices x choices integer matrix, the diagonal holding the vote total of each choice
+    """
+    # float matrix product runs on BLAS and is exact up to 2**53 voters
+    matrix = matrix.astype(np.float64)
+    return np.rint(matrix.T.dot(matrix)).astype(np.int64)
+
+
+""" Type of each choice index stored in a ranked ballot """
+BALLOT_DTYPE = np.uint8
+
+""" Index marking the end of a ranked ballot in a ballot matrix, which limits ranked polls to 255 choices """
+BALLOT_END = np.iinfo(BALLOT_DTYPE).max
+
+
+def encode_ballot(ranking):
+    """
+    :param ranking: sequence of choice indices, most preferred first
+    :return: the ranking packed as bytes, one byte per ranked choice
+    """
+    return np.asarray(ranking, dtype=BALLOT_DTYPE).tobytes()
+
+
+def ballot_matrix(rankings):
+    """
+    Unpack the encoded ballots of a ranked :model:`polls.Poll` into a single matrix.
+
+    :param rankings: sequence of rankings as returned by :func:`encode_ballot`
+    :return: ballots x positions matrix of choice indices, each row padded with at least one :data:`BALLOT_END`
+    """
+    lengths = np.fromiter(map(len, rankings), dtype=np.intp, count=len(rankings))
+    indices = np.frombuffer(b''.join(rankings), dtype=BALLOT_DTYPE)
+    width = lengths.max() + 1 if len(rankings) else 1
+
+    rows = np.repeat(np.arange(len(rankings)), lengths)
+    columns = np.arange(len(indices)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    matrix = np.full((len(rankings), width), BALLOT_END, dtype=BALLOT_DTYPE)
+    matrix[rows, columns] = indices
+    return matrix
+
+
+def instant_runoff(matrix, candidates):
+    """
+    Run an instant-runoff election. Each round counts every ballot for its most preferred candidate still running; a
+    candidate with more than half of the counted ballots wins, otherwise the one with the fewest is eliminated (the
+    lowest index among tied candidates) and its ballots move to their next preference.
+
+    :param matrix: ballot matrix as returned by :func:`ballot_matrix`
+    :param candidates: number of choices in the poll
+    :return: a dictionary {'rounds': [{'counts': [int,], 'eliminated': index or None},], 'winner': index or None}
+    """
+    ballots = np.arange(len(matrix))
+    position = np.zeros(len(matrix), dtype=np.intp)
+    top = matrix[:, 0].copy()
+    eliminated = np.zeros(BALLOT_END + 1, dtype=bool)
+    running = np.ones(candidates, dtype=bool)
+
+    rounds = []
+    winner = None
+    while True:
+        counts = np.bincount(top, minlength=BALLOT_END + 1)[:candidates]
+        rounds.append({'counts': counts.tolist(), 'eliminated': None})
+        counted = counts.sum()
+        if not counted:
+            break
+
+        leader = int(np.argmax(np.where(running, counts, -1)))
+        if counts[leader] * 2 > counted or running.sum() == 1:
+            winner = leader
+            break
+
+        loser = int(np.argmin(np.where(running, counts, len(matrix) + 1)))
+        rounds[-1]['eliminated'] = loser
+        running[loser] = False
+        eliminated[loser] = True
+
+        # only the ballots of the eliminated candidate move, skipping candidates already eliminated
+        moved = ballots[top == loser]
+        while moved.size:
+            position[moved] += 1
+            top[moved] = matrix[moved, position[moved]]
+            moved = moved[eliminated[top[moved]]]
+
+    return {'rounds': rounds, 'winner': winner}
+
+
+def borda(matrix, candidates):
+    """
+    Run a Borda count. A choice ranked i-th (from 0) earns candidates - 1 - i points, unranked choices earn none.
+
+    :param matrix: ballot matrix as returned by :func:`ballot_matrix`
+    :param candidates: number of choices in the poll
+    :return: list with the points of each choice
+    """
+    points = np.broadcast_to(candidates - 1 - np.arange(matrix.shape[1]), matrix.shape)
+    ranked = matrix != BALLOT_END
+    scores = np.bincount(matrix[ranked], weights=points[ranked], minlength=candidates)
+    return scores.astype(np.int64).tolist()
@@ -61,13 +61,14 @@ class CreatePollSettingsForm(forms.ModelForm):
 
     class Meta:
         model = Poll
-        fields = ('single_vote', 'limit_votes', 'votes_max', 'hidden_poll', 'only_invited')
+        fields = ('single_vote', 'limit_votes', 'votes_max', 'hidden_poll', 'only_invited', 'ranked')
         widgets = {
             'single_vote': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'limit_votes': forms.CheckboxInput(attrs={'class': 'form-check-input', 'id': 'limit_votes'}),
             'votes_max': forms.NumberInput(attrs={'class': 'form-control', 'id': 'votes_max'}),
             'hidden_poll': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'only_invited': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'ranked': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
 
 
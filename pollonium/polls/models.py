@@ -1,9 +1,15 @@
 import datetime
+import random
 
 from django.db import models
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from django.core.cache import cache
 from django.utils import timezone
 from django.conf import settings
 
+from .analysis import vote_matrix, cooccurrence, encode_ballot, ballot_matrix, instant_runoff, borda, BALLOT_END
+
 
 """ Descriptions for the :model:`polls.Poll` fields. """
 FIELD_DESC = {
@@ -12,15 +18,36 @@ FIELD_DESC = {
     'limit_votes':  'limit the number of votes per option',
     'votes_max':    'votes per option',
     'only_invited': 'only invited people can see the poll',
+    'ranked':       'participants rank the options (instant-runoff)',
 }
 
+""" Cache key for the vote tallies of a :model:`polls.Poll`, formatted with the poll primary-key. """
+TALLIES_CACHE_KEY = 'polls:tallies:%s'
+
+""" Cache key for the choice co-occurrence report of a :model:`polls.Poll`, formatted with the poll primary-key and
+the report generation. """
+COOCCURRENCE_CACHE_KEY = 'polls:cooccurrence:%s:%s'
+
+""" Cache key for the current co-occurrence report generation of a :model:`polls.Poll`. Deleting it invalidates the
+report, and any update or rebuild still running for the previous generation publishes to a key nobody reads. """
+COOCCURRENCE_GENERATION_KEY = 'polls:cooccurrence:%s:generation'
+
+""" Cache key for the lock held while a vote updates the co-occurrence report of a :model:`polls.Poll`. """
+COOCCURRENCE_LOCK_KEY = 'polls:cooccurrence:%s:lock'
+
+""" Seconds a co-occurrence report update can hold its lock, in case the process dies before releasing it """
+COOCCURRENCE_LOCK_TIMEOUT = 10
+
+""" Cache key for the ranked results of a :model:`polls.Poll`, formatted with the poll primary-key and version. """
+RANKED_CACHE_KEY = 'polls:ranked:%s:%s'
+
 
 class Poll(models.Model):
     """
     Stores a poll and its settings.
     """
     title = models.CharField(max_length=200)
-    pub_date = models.DateTimeField(FIELD_DESC['pub_date'])
+    pub_date = models.DateTimeField(FIELD_DESC['pub_date'], db_index=True)
     location = models.CharField(default='', blank=True, max_length=20)
     description = models.TextField(default='', blank=True)
     author = models.ForeignKey(settings.AUTH_USER_MODEL)
@@ -29,6 +56,112 @@ class Poll(models.Model):
     hidden_poll = models.BooleanField(default=False)                                # TODO implement
     single_vote = models.BooleanField(FIELD_DESC['single_vote'], default=False)
     only_invited = models.BooleanField(FIELD_DESC['only_invited'], default=False)   # TODO implement
+    ranked = models.BooleanField(FIELD_DESC['ranked'], default=False)
+    version = models.PositiveIntegerField(default=0, editable=False)                # bumped on ballot/choice changes
+
+    def save(self, *args, **kwargs):
+        """
+        Save the :model:`polls.Poll`. The version is only changed by :func:`bump_poll_version`, so saving an existing
+        poll never writes back the version it was loaded with.
+        """
+        if (not self._state.adding and not args and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields
+                                       if not f.primary_key and f.name != 'version']
+        super(Poll, self).save(*args, **kwargs)
+
+    @classmethod
+    def get_tallies(cls, pks):
+        """
+        Get the per-choice vote totals and finished state for several :model:`polls.Poll` at once. Cached tallies are
+        served from the cache and the missing ones are loaded in a constant number of grouped queries.
+
+        :param pks: list of :model:`polls.Poll` primary-keys
+        :return: a dictionary {poll_pk: {'finished': bool, 'choices': [{'id', 'text', 'votes'},]},} for the existing
+        polls
+        """
+        keys = {pk: TALLIES_CACHE_KEY % pk for pk in pks}
+        cached = cache.get_many(list(keys.values()))
+        tallies = {pk: cached[key] for pk, key in keys.items() if key in cached}
+
+        missing = [pk for pk in keys if pk not in tallies]
+        if missing:
+            loaded = {pk: {'limit_votes': limit_votes, 'votes_max': votes_max, 'choices': []}
+                      for pk, limit_votes, votes_max in cls.objects.filter(pk__in=missing
+                          ).values_list('pk', 'limit_votes', 'votes_max')}
+            choices = Choice.objects.filter(poll__pk__in=missing
+                ).values_list('poll', 'pk', 'text'
+                ).annotate(votes=models.Count('vote')
+                ).order_by('poll', 'pk')
+            for poll_pk, pk, text, votes in choices:
+                loaded[poll_pk]['choices'].append({'id': pk, 'text': text, 'votes': votes})
+
+            for tally in loaded.values():
+                # same rule as is_finished, without querying again
+                limit_votes, votes_max = tally.pop('limit_votes'), tally.pop('votes_max')
+                votes = sum(c['votes'] for c in tally['choices'])
+                tally['finished'] = limit_votes and votes >= votes_max * len(tally['choices'])
+
+            cache.set_many({keys[pk]: tally for pk, tally in loaded.items()})
+            tallies.update(loaded)
+
+        return tallies
+
+    def get_cooccurrence(self):
+        """
+        Get the cross-tab of the :model:`polls.Choice` voted together by the same :model:`auth.User`. The report is
+        computed over the voters x choices matrix, cached and then kept up to date as votes are submitted.
+
+        :return: a dictionary {'choices': [(pk, text),], 'voters': int, 'counts': matrix}, where counts[i][j] is the
+        number of users that voted both the i-th and j-th choices
+        """
+        # the generation is read before the votes: a vote submitted meanwhile invalidates it
+        key = COOCCURRENCE_CACHE_KEY % (self.pk, get_cooccurrence_generation(self.pk))
+        report = cache.get(key)
+        if report is None:
+            choices = list(self.choice_set.order_by('pk').values_list('pk', 'text'))
+            votes = list(Vote.objects.filter(choice__poll__pk=self.pk).values_list('user', 'choice'))
+            matrix = vote_matrix(votes, [pk for pk, _ in choices])
+            report = {'choices': choices, 'voters': len(matrix), 'counts': cooccurrence(matrix)}
+            # never overwrite a report updated by a vote submitted meanwhile
+            cache.add(key, report)
+        return report
+
+    def cast_ballot(self, user, choice_pks):
+        """
+        Store the ranked ballot of a :model:`auth.User`, replacing any previous one. The ranking is stored as the
+        indices of the :model:`polls.Choice` in primary-key order.
+
+        :param user: :model:`auth.User` who votes
+        :param choice_pks: :model:`polls.Choice` primary-keys, most preferred first
+        :return: the stored :model:`polls.Ballot` instance
+        :raise ValueError: if the ranking is empty, repeats a choice or contains a choice from another poll
+        """
+        pks = list(self.choice_set.order_by('pk').values_list('pk', flat=True))
+        if not choice_pks or len(set(choice_pks)) != len(choice_pks) or len(pks) >= BALLOT_END:
+            raise ValueError('Invalid ranking for poll %s' % self.pk)
+        ranking = [pks.index(pk) for pk in choice_pks]
+        ballot, _ = Ballot.objects.update_or_create(poll=self, user=user,
+                                                    defaults={'ranking': encode_ballot(ranking)})
+        return ballot
+
+    def get_ranked_results(self):
+        """
+        Tally all the :model:`polls.Ballot` of a ranked :model:`polls.Poll` with instant-runoff and Borda count. The
+        results are cached for the current poll version.
+
+        :return: a dictionary {'choices': [(pk, text),], 'ballots': int, 'rounds': [{'counts', 'eliminated'},],
+        'winner': index or None, 'borda': [int,]}, choices referred by their index in the choices list
+        """
+        key = RANKED_CACHE_KEY % (self.pk, self.version)
+        results = cache.get(key)
+        if results is None:
+            choices = list(self.choice_set.order_by('pk').values_list('pk', 'text'))
+            ballots = ballot_matrix(list(self.ballot_set.values_list('ranking', flat=True)))
+            results = instant_runoff(ballots, len(choices))
+            results.update(choices=choices, ballots=len(ballots), borda=borda(ballots, len(choices)))
+            cache.set(key, results)
+        return results
 
     def get_votes_list(self):
         return list(Vote.objects.filter(choice__poll__pk=self.pk
@@ -133,4 +266,176 @@ class Vote(models.Model):
         """
         :return: string representation containing voted :model:`polls.Choice` and the :model:`auth.User` who voted it
         """
-        return 'Vote for %s by %s in %s' % (self.choice, self.user, self.poll)
+        return 'Vote for %s by %s in %s' % (self.choice, self.user, self.choice.poll)
+
+
+class Ballot(models.Model):
+    """
+    Store the ranked ballot of a :model:`auth.User` for a ranked :model:`polls.Poll`. The ranking holds one byte per
+    ranked :model:`polls.Choice`, its index in primary-key order, most preferred first. Ballots are deleted when a
+    choice is deleted from the poll; new choices get the highest primary key, so adding one keeps the indices valid.
+    """
+    poll = models.ForeignKey(Poll, on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL)
+    ranking = models.BinaryField()
+
+    class Meta:
+        unique_together = ('poll', 'user')
+
+    def __str__(self):
+        """
+        :return: string representation containing the :model:`auth.User` who voted and the :model:`polls.Poll`
+        """
+        return 'Ballot by %s in %s' % (self.user, self.poll)
+
+
+def clear_poll_caches(poll_pks):
+    """
+    Invalidate the cached tallies and co-occurrence reports of several :model:`polls.Poll`. :model:`polls.Vote` have
+    no post_delete receiver so they are deleted in bulk: code deleting votes directly calls this function itself.
+
+    :param poll_pks: list of :model:`polls.Poll` primary-keys
+    """
+    cache.delete_many([key % pk for pk in poll_pks for key in (TALLIES_CACHE_KEY, COOCCURRENCE_GENERATION_KEY)])
+
+
+@receiver([post_save, pre_delete], sender=Poll)
+def clear_poll_tallies(sender, instance, **kwargs):
+    """
+    Invalidate the cached results of a :model:`polls.Poll` when its settings change or it is deleted.
+    """
+    clear_poll_caches([instance.pk])
+
+
+@receiver([post_save, pre_delete], sender=Choice)
+def clear_choice_caches(sender, instance, **kwargs):
+    """
+    Invalidate the cached tallies and co-occurrence report of the :model:`polls.Poll` a :model:`polls.Choice`
+    belongs to. Deleting a choice shifts the choice indices stored in the :model:`polls.Ballot`, so the ballots of a
+    ranked poll are deleted too.
+    """
+    clear_poll_caches([instance.poll_id])
+    if kwargs['signal'] is pre_delete:
+        Ballot.objects.filter(poll__pk=instance.poll_id, poll__ranked=True).delete()
+    bump_poll_version(instance.poll_id)
+
+
+@receiver(post_save, sender=Ballot)
+def clear_ballot_caches(sender, instance, **kwargs):
+    """
+    Expire the cached ranked-choice results of the :model:`polls.Poll` a :model:`polls.Ballot` was cast in. There is
+    no post_delete receiver so ballots are deleted in bulk: code deleting ballots bumps the poll version itself.
+    """
+    bump_poll_version(instance.poll_id)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def clear_user_vote_caches(sender, instance, **kwargs):
+    """
+    Invalidate the cached results of the :model:`polls.Poll` where a deleted :model:`auth.User` voted, before the
+    votes are deleted in bulk.
+    """
+    clear_poll_caches(Vote.objects.filter(user=instance).values_list('choice__poll', flat=True).distinct())
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def clear_user_ballot_caches(sender, instance, **kwargs):
+    """
+    Expire the cached ranked-choice results of the :model:`polls.Poll` where a deleted :model:`auth.User` voted.
+    """
+    Poll.objects.filter(ballot__user=instance).update(version=models.F('version') + 1)
+
+
+def bump_poll_version(poll_pk):
+    """
+    Increase the version of a :model:`polls.Poll`, so its results cached for previous versions are not used anymore.
+
+    :param poll_pk: :model:`polls.Poll` primary-key
+    """
+    Poll.objects.filter(pk=poll_pk).update(version=models.F('version') + 1)
+
+
+@receiver(post_save, sender=Vote)
+def update_vote_caches(sender, instance, created=False, **kwargs):
+    """
+    Invalidate the cached tallies of the :model:`polls.Poll` a :model:`polls.Vote` was submitted to, and apply the
+    new vote to its cached co-occurrence report. There is no post_delete receiver, see :func:`clear_poll_caches`.
+    """
+    poll_pk = Choice.objects.filter(pk=instance.choice_id).values_list('poll', flat=True).first()
+    if poll_pk is not None:
+        cache.delete(TALLIES_CACHE_KEY % poll_pk)
+        if created:
+            add_cooccurrence_vote(poll_pk, instance)
+        else:
+            cache.delete(COOCCURRENCE_GENERATION_KEY % poll_pk)
+
+
+def get_cooccurrence_generation(poll_pk):
+    """
+    :param poll_pk: :model:`polls.Poll` primary-key
+    :return: the current co-occurrence report generation of the poll, starting a new random one if there is none
+    """
+    key = COOCCURRENCE_GENERATION_KEY % poll_pk
+    generation = random.getrandbits(48)
+    cache.add(key, generation)
+    return cache.get(key, generation)
+
+
+def add_cooccurrence_vote(poll_pk, vote):
+    """
+    Add a submitted :model:`polls.Vote` to the cached co-occurrence report of a :model:`polls.Poll`, if any. The
+    update holds a lock in the cache. When the lock is busy, or there is no report to update while a rebuild may be
+    reading the votes, the report generation is invalidated instead, so no stale report is ever published.
+
+    :param poll_pk: :model:`polls.Poll` primary-key
+    :param vote: the :model:`polls.Vote` submitted
+    """
+    generation_key = COOCCURRENCE_GENERATION_KEY % poll_pk
+    lock = COOCCURRENCE_LOCK_KEY % poll_pk
+    if not cache.add(lock, True, COOCCURRENCE_LOCK_TIMEOUT):
+        cache.delete(generation_key)
+        return
+    try:
+        generation = cache.get(generation_key)
+        key = COOCCURRENCE_CACHE_KEY % (poll_pk, generation)
+        report = None if generation is None else cache.get(key)
+        if report is not None:
+            report = add_vote_to_report(report, poll_pk, vote)
+        if report is None:
+            cache.delete(generation_key)
+        else:
+            cache.set(key, report)
+    finally:
+        cache.delete(lock)
+
+
+def add_vote_to_report(report, poll_pk, vote):
+    """
+    Apply a submitted :model:`polls.Vote` to a co-occurrence report.
+
+    :param report: co-occurrence report as returned by :model:`polls.Poll` get_cooccurrence
+    :param poll_pk: :model:`polls.Poll` primary-key
+    :param vote: the :model:`polls.Vote` submitted
+    :return: the updated report, or None if it must be rebuilt
+    """
+    pks = [pk for pk, _ in report['choices']]
+    if vote.choice_id not in pks:
+        return None
+
+    # choices voted by the same user, apart from this vote
+    others = set(Vote.objects.filter(choice__poll__pk=poll_pk, user=vote.user_id
+        ).exclude(pk=vote.pk
+        ).values_list('choice', flat=True))
+    if vote.choice_id in others:
+        # duplicated vote, the user x choice matrix does not change
+        return report
+
+    i = pks.index(vote.choice_id)
+    j = [pks.index(pk) for pk in others if pk in pks]
+    counts = report['counts']
+    counts[i, j] += 1
+    counts[j, i] += 1
+    counts[i, i] += 1
+    if not others:
+        report['voters'] += 1
+    return report
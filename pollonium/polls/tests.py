@@ -1,3 +1,550 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import SimpleTestCase, TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .analysis import vote_matrix, cooccurrence, encode_ballot, ballot_matrix, instant_runoff, borda
+from . import models
+from .models import Poll, Choice, Vote, Ballot, TALLIES_CACHE_KEY, COOCCURRENCE_GENERATION_KEY, COOCCURRENCE_LOCK_KEY
+from .models import clear_poll_caches
+
+
+def create_poll(author, voters, choices=3, **kwargs):
+    """
+    Create a :model:`polls.Poll` with the given number of :model:`polls.Choice`, voted once by each voter.
+
+    :param author: :model:`auth.User` owner of the poll
+    :param voters: list of :model:`auth.User` that vote every choice
+    :param choices: number of choices to create
+    :param kwargs: extra :model:`polls.Poll` fields
+    :return: the created :model:`polls.Poll` instance
+    """
+    poll = Poll.objects.create(title='Poll', pub_date=timezone.now(), author=author, **kwargs)
+    for i in range(choices):
+        choice = Choice.objects.create(poll=poll, text='Choice %i' % i)
+        Vote.objects.bulk_create([Vote(choice=choice, user=u) for u in voters])
+    return poll
+
+
+class PollAdminTests(TestCase):
+    """
+    Query counts of the :model:`polls.Poll` and :model:`polls.Vote` admin views must not grow with the data.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.voters = [User.objects.create_user('voter%i' % i) for i in range(5)]
+        cls.poll = create_poll(cls.admin, cls.voters)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelist_num_queries(self):
+        for _ in range(10):
+            create_poll(self.voters[0], self.voters)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:polls_poll_changelist'))
+        self.assertEqual(len(queries), 5)
+        self.assertContains(response, '<td class="field-total_votes">15</td>', count=11, html=True)
+        # only the query counting the votes of the page reads the votes table
+        self.assertEqual(len([q for q in queries if 'polls_vote' in q['sql']]), 1)
+
+    def test_changelist_filtered_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('admin:polls_poll_changelist'), {'q': 'Poll'})
+        counts = [q['sql'] for q in queries if 'COUNT' in q['sql'] and 'polls_poll' in q['sql']]
+        self.assertEqual(len(counts), 1)
+        self.assertNotIn('polls_vote', counts[0])
+
+    def test_change_form_num_queries(self):
+        with self.assertNumQueries(8):
+            response = self.client.get(reverse('admin:polls_poll_change', args=(self.poll.pk,)))
+        self.assertContains(response, '<td class="field-total_votes"><p>5</p></td>', count=3, html=True)
+
+    def test_vote_changelist_num_queries(self):
+        create_poll(self.admin, self.voters, choices=10)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('admin:polls_vote_changelist'))
+        self.assertContains(response, 'field-poll', count=65)
+
+    def test_vote_admin_is_read_only(self):
+        response = self.client.get(reverse('admin:polls_vote_add'))
+        self.assertEqual(response.status_code, 403)
+
+
+class TalliesViewTests(TestCase):
+    """
+    The :view:`polls.tallies` endpoint loads the uncached polls in a constant number of queries.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.voters = [User.objects.create_user('voter%i' % i) for i in range(3)]
+        cls.open_poll = create_poll(cls.author, cls.voters[:1], choices=2)
+        cls.full_poll = create_poll(cls.author, cls.voters, choices=2, limit_votes=True, votes_max=3)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_tallies(self, *polls):
+        return self.client.get(reverse('polls:tallies'), {'ids': ','.join(str(p.pk) for p in polls)})
+
+    def test_tallies(self):
+        with self.assertNumQueries(2):
+            response = self.get_tallies(self.open_poll, self.full_poll)
+        tallies = response.json()['polls']
+        self.assertEqual(set(tallies), {str(self.open_poll.pk), str(self.full_poll.pk)})
+        self.assertFalse(tallies[str(self.open_poll.pk)]['finished'])
+        self.assertTrue(tallies[str(self.full_poll.pk)]['finished'])
+        self.assertEqual([c['votes'] for c in tallies[str(self.open_poll.pk)]['choices']], [1, 1])
+        self.assertEqual([c['votes'] for c in tallies[str(self.full_poll.pk)]['choices']], [3, 3])
+
+    def test_tallies_cached(self):
+        self.get_tallies(self.open_poll, self.full_poll)
+        with self.assertNumQueries(0):
+            self.get_tallies(self.open_poll, self.full_poll)
+
+        # a new vote only invalidates its own poll
+        Vote.objects.create(choice=self.open_poll.choice_set.first(), user=self.voters[1])
+        with self.assertNumQueries(2):
+            response = self.get_tallies(self.open_poll, self.full_poll)
+        self.assertEqual(response.json()['polls'][str(self.open_poll.pk)]['choices'][0]['votes'], 2)
+
+    def test_choice_deleted_in_bulk(self):
+        Vote.objects.bulk_create([Vote(choice=self.open_poll.choice_set.first(), user=u) for u in self.voters] * 100)
+        self.get_tallies(self.open_poll)
+        with CaptureQueriesContext(connection) as queries:
+            self.open_poll.choice_set.first().delete()
+        # the votes are deleted with a single query, without loading them
+        self.assertEqual([q['sql'].split()[0] for q in queries if 'polls_vote' in q['sql']], ['DELETE'])
+        response = self.get_tallies(self.open_poll)
+        self.assertEqual(len(response.json()['polls'][str(self.open_poll.pk)]['choices']), 1)
+
+    def test_user_deleted(self):
+        self.get_tallies(self.open_poll, self.full_poll)
+        User.objects.filter(pk=self.voters[1].pk).delete()
+        # only the tallies of the polls where the user voted are invalidated
+        self.assertIsNotNone(cache.get(TALLIES_CACHE_KEY % self.open_poll.pk))
+        self.assertIsNone(cache.get(TALLIES_CACHE_KEY % self.full_poll.pk))
+        response = self.get_tallies(self.open_poll, self.full_poll)
+        self.assertEqual([c['votes'] for c in response.json()['polls'][str(self.full_poll.pk)]['choices']], [2, 2])
+
+    def test_tallies_unknown_poll(self):
+        response = self.client.get(reverse('polls:tallies'), {'ids': '%i,0' % self.open_poll.pk})
+        self.assertEqual(list(response.json()['polls']), [str(self.open_poll.pk)])
+
+    def test_tallies_invalid_ids(self):
+        response = self.client.get(reverse('polls:tallies'), {'ids': '1,a'})
+        self.assertEqual(response.status_code, 400)
+
+
+@tag('benchmark')
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'OPTIONS': {'MAX_ENTRIES': 1000},
+}})
+class TalliesBenchmarks(TestCase):
+    """
+    Time the :view:`polls.tallies` endpoint for 1, 50 and 500 polls per request, with cold and warm cache.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.voters = [User.objects.create_user('voter%i' % i) for i in range(10)]
+        cls.polls = [create_poll(cls.author, cls.voters, choices=5) for _ in range(500)]
+
+    def setUp(self):
+        cache.clear()
+
+    def bench(self, n):
+        ids = ','.join(str(p.pk) for p in self.polls[:n])
+        for state, num_queries in (('cold', 2), ('warm', 0)):
+            start = time.perf_counter()
+            with self.assertNumQueries(num_queries):
+                response = self.client.get(reverse('polls:tallies'), {'ids': ids})
+            print('tallies %3i polls, %s cache: %.2f ms' % (n, state, (time.perf_counter() - start) * 1000))
+            self.assertEqual(len(response.json()['polls']), n)
+
+    def test_bench_1(self):
+        self.bench(1)
+
+    def test_bench_50(self):
+        self.bench(50)
+
+    def test_bench_500(self):
+        self.bench(500)
+
+
+class CooccurrenceTests(TestCase):
+    """
+    The co-occurrence report of a :model:`polls.Poll` is cached, updated as votes are submitted and dropped as they are
+    deleted.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.voters = [User.objects.create_user('voter%i' % i) for i in range(4)]
+        cls.poll = Poll.objects.create(title='Poll', pub_date=timezone.now(), author=cls.author)
+        cls.choices = [Choice.objects.create(poll=cls.poll, text=text) for text in 'ABC']
+        for user, voted in zip(cls.voters, ['AB', 'A', 'BC']):
+            for text in voted:
+                Vote.objects.create(choice=cls.choices['ABC'.index(text)], user=user)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertReportUpToDate(self):
+        with self.assertNumQueries(0):
+            report = self.poll.get_cooccurrence()
+        cache.clear()
+        expected = self.poll.get_cooccurrence()
+        self.assertEqual(report['voters'], expected['voters'])
+        np.testing.assert_array_equal(report['counts'], expected['counts'])
+
+    def test_cooccurrence(self):
+        response = self.client.get(reverse('polls:cooccurrence', args=(self.poll.pk,)))
+        report = response.json()
+        self.assertEqual(report['voters'], 3)
+        self.assertEqual([c['text'] for c in report['choices']], ['A', 'B', 'C'])
+        self.assertEqual(report['counts'], [[2, 1, 0], [1, 2, 1], [0, 1, 1]])
+
+    def test_cooccurrence_vote_submitted(self):
+        self.poll.get_cooccurrence()
+        Vote.objects.create(choice=self.choices[2], user=self.voters[1])
+        self.assertReportUpToDate()
+        Vote.objects.create(choice=self.choices[0], user=self.voters[3])
+        self.assertReportUpToDate()
+
+    def assertReportRebuilt(self, voters, counts):
+        self.assertIsNone(cache.get(COOCCURRENCE_GENERATION_KEY % self.poll.pk))
+        report = self.poll.get_cooccurrence()
+        self.assertEqual(report['voters'], voters)
+        self.assertEqual(report['counts'].tolist(), counts)
+
+    def test_cooccurrence_vote_deleted(self):
+        self.poll.get_cooccurrence()
+        Vote.objects.filter(user=self.voters[0], choice=self.choices[1]).delete()
+        clear_poll_caches([self.poll.pk])
+        self.assertReportRebuilt(3, [[2, 0, 0], [0, 1, 1], [0, 1, 1]])
+
+    def test_cooccurrence_user_deleted(self):
+        self.poll.get_cooccurrence()
+        User.objects.filter(pk=self.voters[0].pk).delete()
+        self.assertReportRebuilt(2, [[1, 0, 0], [0, 1, 1], [0, 1, 1]])
+        User.objects.filter(pk=self.voters[2].pk).delete()
+        self.assertReportRebuilt(1, [[1, 0, 0], [0, 0, 0], [0, 0, 0]])
+
+    def test_cooccurrence_choice_deleted(self):
+        self.poll.get_cooccurrence()
+        Choice.objects.filter(pk=self.choices[1].pk).delete()
+        self.assertReportRebuilt(3, [[2, 0], [0, 1]])
+
+    def test_cooccurrence_update_locked(self):
+        self.poll.get_cooccurrence()
+        cache.add(COOCCURRENCE_LOCK_KEY % self.poll.pk, True)
+        Vote.objects.create(choice=self.choices[2], user=self.voters[1])
+        self.assertReportRebuilt(3, [[2, 1, 1], [1, 2, 1], [1, 1, 2]])
+
+    def test_cooccurrence_vote_during_update(self):
+        self.poll.get_cooccurrence()
+        add_vote_to_report = models.add_vote_to_report
+
+        def add_vote_during_update(*args):
+            # the second vote finds the lock held by the first one
+            with mock.patch.object(models, 'add_vote_to_report', add_vote_to_report):
+                Vote.objects.create(choice=self.choices[0], user=self.voters[3])
+            return add_vote_to_report(*args)
+
+        with mock.patch.object(models, 'add_vote_to_report', add_vote_during_update):
+            Vote.objects.create(choice=self.choices[2], user=self.voters[1])
+        self.assertReportRebuilt(4, [[3, 1, 1], [1, 2, 1], [1, 1, 2]])
+
+    def test_cooccurrence_vote_during_rebuild(self):
+        vote_matrix = models.vote_matrix
+
+        def add_vote_during_rebuild(*args):
+            # the votes were already read when the new vote is submitted
+            Vote.objects.create(choice=self.choices[2], user=self.voters[1])
+            return vote_matrix(*args)
+
+        with mock.patch.object(models, 'vote_matrix', add_vote_during_rebuild):
+            self.poll.get_cooccurrence()
+        self.assertReportRebuilt(3, [[2, 1, 1], [1, 2, 1], [1, 1, 2]])
+
+    def test_cooccurrence_choice_added(self):
+        self.poll.get_cooccurrence()
+        Choice.objects.create(poll=self.poll, text='D')
+        self.assertEqual(len(self.poll.get_cooccurrence()['choices']), 4)
+
+
+@tag('benchmark')
+class CooccurrenceBenchmarks(TestCase):
+    """
+    Time the co-occurrence report for 100k voters x 50 choices, each choice voted by 20% of the voters (~1M votes).
+    The sub-second target applies to the matrix computation; a full rebuild is dominated by reading the votes from the
+    database, which is why the report is cached and updated as votes arrive.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        rng = np.random.RandomState(0)
+        cls.voted = rng.rand(100000, 50) < 0.2
+        author = User.objects.create_user('author')
+        User.objects.bulk_create([User(username='voter%i' % i) for i in range(len(cls.voted))], batch_size=500)
+        user_pks = np.array(User.objects.exclude(pk=author.pk).order_by('pk').values_list('pk', flat=True))
+        cls.poll = Poll.objects.create(title='Poll', pub_date=timezone.now(), author=author)
+        choice_pks = np.array([Choice.objects.create(poll=cls.poll, text='Choice %i' % i).pk for i in range(50)])
+        users, choices = np.nonzero(cls.voted)
+        Vote.objects.bulk_create([Vote(user_id=int(u), choice_id=int(c))
+                                  for u, c in zip(user_pks[users], choice_pks[choices])], batch_size=500)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bench_matrix(self):
+        """
+        Matrix build and product only, over votes already in memory: the database read is not included.
+        """
+        users, choices = np.nonzero(self.voted)
+        votes = np.column_stack([users + 1, choices + 1])
+
+        start = time.perf_counter()
+        counts = cooccurrence(vote_matrix(votes, np.arange(1, 51)))
+        elapsed = time.perf_counter() - start
+        print('cooccurrence 100k voters x 50 choices, in memory: %.2f ms' % (elapsed * 1000))
+
+        np.testing.assert_array_equal(counts.diagonal(), self.voted.sum(axis=0))
+        self.assertEqual(counts[0, 1], np.count_nonzero(self.voted[:, 0] & self.voted[:, 1]))
+        self.assertLess(elapsed, 1)
+
+    def test_bench_get_cooccurrence(self):
+        """
+        Rebuild of the report by :model:`polls.Poll` get_cooccurrence, reading the ~1M votes from the database.
+        """
+        start = time.perf_counter()
+        report = self.poll.get_cooccurrence()
+        elapsed = time.perf_counter() - start
+        print('cooccurrence 100k voters x 50 choices, from the database: %.2f ms' % (elapsed * 1000))
+
+        self.assertEqual(report['voters'], np.count_nonzero(self.voted.any(axis=1)))
+        np.testing.assert_array_equal(report['counts'].diagonal(), self.voted.sum(axis=0))
+
+
+def random_ballots(n, candidates, seed=0):
+    """
+    :return: list of n encoded random rankings of 1 to candidates choices
+    """
+    rng = np.random.RandomState(seed)
+    lengths = rng.randint(1, candidates + 1, size=n)
+    rankings = np.argsort(rng.rand(n, candidates), axis=1)
+    return [encode_ballot(ranking[:length]) for ranking, length in zip(rankings, lengths)]
+
+
+class RankedPollTests(TestCase):
+    """
+    Ranked :model:`polls.Poll` store :model:`polls.Ballot` and tally them with instant-runoff and Borda count.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.voters = [User.objects.create_user('voter%i' % i) for i in range(5)]
+        cls.poll = Poll.objects.create(title='Poll', pub_date=timezone.now(), author=cls.author, ranked=True)
+        cls.choices = [Choice.objects.create(poll=cls.poll, text=text) for text in 'ABC']
+
+    def setUp(self):
+        cache.clear()
+
+    def cast(self, user, ranking):
+        self.poll.cast_ballot(user, [self.choices['ABC'.index(text)].pk for text in ranking])
+
+    def test_ranked_results(self):
+        for user, ranking in zip(self.voters, ['AB', 'A', 'BC', 'CB', 'CB']):
+            self.cast(user, ranking)
+        response = self.client.get(reverse('polls:ranked_results', args=(self.poll.pk,)))
+        results = response.json()
+        a, b, c = (str(choice.pk) for choice in self.choices)
+        self.assertEqual(results['ballots'], 5)
+        self.assertEqual(results['rounds'][0], {'counts': {a: 2, b: 1, c: 2}, 'eliminated': int(b)})
+        self.assertEqual(results['rounds'][1], {'counts': {a: 2, b: 0, c: 3}, 'eliminated': None})
+        self.assertEqual(results['winner'], int(c))
+        self.assertEqual([choice['borda'] for choice in results['choices']], [4, 5, 5])
+
+    def test_ranked_results_cached_per_version(self):
+        self.cast(self.voters[0], 'AB')
+        self.poll.refresh_from_db()
+        self.poll.get_ranked_results()
+        with self.assertNumQueries(0):
+            self.poll.get_ranked_results()
+
+        self.cast(self.voters[0], 'BA')
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.get_ranked_results()['winner'], 1)
+
+    def test_poll_save_keeps_version(self):
+        poll = Poll.objects.get(pk=self.poll.pk)
+        self.cast(self.voters[0], 'AB')
+        poll.title = 'Renamed'
+        poll.save()
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.title, 'Renamed')
+        self.assertGreater(self.poll.version, poll.version)
+
+    def test_poll_save_explicit_pk(self):
+        Poll(pk=9999, title='Poll', pub_date=timezone.now(), author=self.author).save()
+        self.assertTrue(Poll.objects.filter(pk=9999).exists())
+
+    def test_edit_poll_expires_results(self):
+        self.cast(self.voters[0], 'AB')
+        self.poll.refresh_from_db()
+        self.poll.get_ranked_results()
+
+        self.client.force_login(self.author)
+        url = reverse('polls:edit', args=(self.poll.pk,))
+        self.client.get(url)
+        for step, data in (('general', {'general-title': 'Poll', 'general-location': '', 'general-description': ''}),
+                           ('choices', {'choices-choice1': 'X', 'choices-choice2': 'Y'}),
+                           ('settings', {'settings-votes_max': '0', 'settings-ranked': 'on'})):
+            data['edit_poll_wizard-current_step'] = step
+            response = self.client.post(url, data)
+        self.assertRedirects(response, reverse('polls:detail', args=(self.poll.pk,)))
+
+        self.poll.refresh_from_db()
+        results = self.poll.get_ranked_results()
+        self.assertEqual([text for _, text in results['choices']], ['X', 'Y'])
+
+    def test_choice_deleted_clears_ballots(self):
+        self.cast(self.voters[0], 'CB')
+        Choice.objects.get(pk=self.choices[0].pk).delete()
+        self.poll.refresh_from_db()
+        results = self.poll.get_ranked_results()
+        self.assertEqual(results['ballots'], 0)
+        self.assertIsNone(results['winner'])
+        self.assertFalse(Ballot.objects.exists())
+
+    def test_choice_renamed_keeps_ballots(self):
+        self.cast(self.voters[0], 'CB')
+        choice = Choice.objects.get(pk=self.choices[0].pk)
+        choice.text = 'Z'
+        choice.save()
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.get_ranked_results()['winner'], 2)
+
+    def test_choice_added_keeps_ballots(self):
+        self.cast(self.voters[0], 'CB')
+        choice = Choice.objects.create(poll=self.poll, text='D')
+        self.poll.refresh_from_db()
+        results = self.poll.get_ranked_results()
+        self.assertEqual(results['ballots'], 1)
+        self.assertEqual(results['winner'], 2)
+        self.assertEqual(results['choices'][-1], (choice.pk, 'D'))
+
+    def test_user_deleted_expires_results(self):
+        self.cast(self.voters[0], 'CB')
+        self.cast(self.voters[1], 'A')
+        self.cast(self.voters[2], 'A')
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.get_ranked_results()['winner'], 0)
+        User.objects.filter(pk__in=[self.voters[1].pk, self.voters[2].pk]).delete()
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.get_ranked_results()['winner'], 2)
+
+    def test_cast_ballot_invalid(self):
+        other = create_poll(self.author, [])
+        for ranking in ([], [self.choices[0].pk] * 2, [other.choice_set.first().pk]):
+            with self.assertRaises(ValueError):
+                self.poll.cast_ballot(self.voters[0], ranking)
+        self.assertFalse(Ballot.objects.exists())
+
+    def test_detail_ballot(self):
+        self.client.force_login(self.voters[0])
+        a, b, c = self.choices
+        self.client.post(reverse('polls:detail', args=(self.poll.pk,)),
+                         {'rank%i' % a.pk: '2', 'rank%i' % b.pk: '', 'rank%i' % c.pk: '1'})
+        ballot = Ballot.objects.get(poll=self.poll, user=self.voters[0])
+        self.assertEqual(bytes(ballot.ranking), encode_ballot([2, 0]))
+
+    def test_detail_ballot_invalid_ranks(self):
+        self.client.force_login(self.voters[0])
+        a, b, c = self.choices
+        for ranks in (('1', '1', ''), ('1', '', '3'), ('0', '1', ''), ('1', '2', '4'), ('', '', '')):
+            self.client.post(reverse('polls:detail', args=(self.poll.pk,)),
+                             {'rank%i' % choice.pk: rank for choice, rank in zip(self.choices, ranks)})
+        self.assertFalse(Ballot.objects.exists())
+
+    def test_detail_ballot_anonymous(self):
+        url = reverse('polls:detail', args=(self.poll.pk,))
+        response = self.client.post(url, {'rank%i' % self.choices[0].pk: '1'})
+        self.assertRedirects(response, '%s?next=%s' % (reverse('polls:login'), url), fetch_redirect_response=False)
+        self.assertFalse(Ballot.objects.exists())
+
+
+class RankedTallyTests(SimpleTestCase):
+    """
+    The vectorised tally engine matches a plain per-ballot implementation.
+    """
+    def test_instant_runoff(self):
+        candidates = 6
+        rankings = random_ballots(2000, candidates)
+        ballots = [list(r) for r in rankings]
+
+        running = set(range(candidates))
+        rounds = []
+        while True:
+            counts = [0] * candidates
+            for ballot in ballots:
+                top = next((c for c in ballot if c in running), None)
+                if top is not None:
+                    counts[top] += 1
+            leader = max(running, key=lambda c: (counts[c], -c))
+            if counts[leader] * 2 > sum(counts) or len(running) == 1:
+                rounds.append({'counts': counts, 'eliminated': None})
+                break
+            loser = min(running, key=lambda c: (counts[c], c))
+            rounds.append({'counts': counts, 'eliminated': loser})
+            running.remove(loser)
+
+        results = instant_runoff(ballot_matrix(rankings), candidates)
+        self.assertEqual(results['rounds'], rounds)
+        self.assertEqual(results['winner'], leader)
+
+    def test_borda(self):
+        candidates = 6
+        rankings = random_ballots(2000, candidates)
+        points = [0] * candidates
+        for ranking in rankings:
+            for i, c in enumerate(ranking):
+                points[c] += candidates - 1 - i
+        self.assertEqual(borda(ballot_matrix(rankings), candidates), points)
+
+    def test_no_ballots(self):
+        results = instant_runoff(ballot_matrix([]), 3)
+        self.assertIsNone(results['winner'])
+        self.assertEqual(borda(ballot_matrix([]), 3), [0, 0, 0])
+
+
+@tag('benchmark')
+class RankedTallyBenchmarks(SimpleTestCase):
+    """
+    Time the instant-runoff and Borda tallies of 1M ballots across 20 candidates.
+    """
+    def test_bench_1m_ballots_20_candidates(self):
+        rankings = random_ballots(1000000, 20)
+
+        start = time.perf_counter()
+        ballots = ballot_matrix(rankings)
+        unpacked = time.perf_counter()
+        results = instant_runoff(ballots, 20)
+        runoff = time.perf_counter()
+        points = borda(ballots, 20)
+        end = time.perf_counter()
+        print('ranked 1M ballots x 20 candidates: unpack %.2f ms, instant-runoff %.2f ms (%i rounds), borda %.2f ms'
+              % ((unpacked - start) * 1000, (runoff - unpacked) * 1000, len(results['rounds']), (end - runoff) * 1000))
+
+        self.assertEqual(sum(results['rounds'][0]['counts']), 1000000)
+        self.assertEqual(len(points), 20)
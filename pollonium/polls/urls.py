@@ -12,7 +12,10 @@ urlpatterns = [
                                                   template_name='polls/login.html'), name='login'),
     url(r'^logout/$', auth_views.LogoutView.as_view(next_page='polls:index',
                                                     template_name='polls/logout.html'), name='logout'),
+    url(r'^tallies/$', views.tallies, name='tallies'),
     url(r'^(?P<pk>[0-9]+)/$', views.detail, name='detail'),
+    url(r'^(?P<pk>[0-9]+)/cooccurrence/$', views.cooccurrence, name='cooccurrence'),
+    url(r'^(?P<pk>[0-9]+)/ranked/$', views.ranked_results, name='ranked_results'),
     url(r'^(?P<pk>[0-9]+)/edit/$', views.EditPollWizard.as_view(views.CREATE_FORMS), name='edit'),
     url(r'^create/$', views.CreatePollWizard.as_view(views.CREATE_FORMS), name='create'),
 ]
\ No newline at end of file
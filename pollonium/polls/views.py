@@ -1,9 +1,10 @@
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render, get_object_or_404, reverse, redirect
 from django.core.urlresolvers import reverse_lazy
 from django.utils import timezone
 from django.contrib import messages
 from django.contrib.auth import login, authenticate
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth.models import User
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, CreateView
@@ -39,7 +40,22 @@ def detail(request, pk):
     :return: HTTP response
     """
     poll = get_object_or_404(Poll, pk=pk)
-    if request.POST:
+    if request.POST and poll.ranked:
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), 'polls:login')
+        try:
+            # get the rank given to each choice pk, from the rank<pk> fields
+            ranks = {int(k[len('rank'):]): int(v) for k, v in request.POST.items() if k.startswith('rank') and v}
+            # the ranked choices must be numbered once each, from 1 up
+            if sorted(ranks.values()) != list(range(1, len(ranks) + 1)):
+                raise ValueError('Invalid ranks for poll %s' % poll.pk)
+            poll.cast_ballot(request.user, sorted(ranks, key=ranks.get))
+        except ValueError:
+            messages.error(request, 'Ops! Error processing your ballot. Please, rank each option once and try again!')
+        else:
+            messages.success(request, 'Your ballot has been submitted. Thanks for voting!')
+        return HttpResponseRedirect(reverse('polls:detail', args=(poll.id,)))
+    elif request.POST:
         try:
             # get the pk of the choice voted
             selected_choice = poll.choice_set.get(pk=request.POST['choice'])
@@ -72,6 +88,70 @@ def detail(request, pk):
     return render(request, 'polls/details.html', {'poll': poll, 'vote_table': vote_table})
 
 
+""" Maximum number of :model:`polls.Poll` tallies returned by a single :view:`polls.tallies` request """
+TALLIES_MAX = 500
+
+
+def tallies(request):
+    """
+    Return as JSON the per-choice vote totals and the finished state of several :model:`polls.Poll`, to feed pages
+    embedding many result widgets with a single request. The polls are given as comma-separated primary-keys in the
+    ``ids`` query parameter; unknown polls are left out of the response.
+
+    :param request: HTTP request
+    :return: JSON response {'polls': {poll_pk: {'finished': bool, 'choices': [{'id', 'text', 'votes'},]},}}
+    """
+    try:
+        pks = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk]
+    except ValueError:
+        return HttpResponseBadRequest('Poll ids must be comma-separated integers.')
+    if len(pks) > TALLIES_MAX:
+        return HttpResponseBadRequest('At most %i polls can be requested at once.' % TALLIES_MAX)
+
+    return JsonResponse({'polls': Poll.get_tallies(pks)})
+
+
+def cooccurrence(request, pk):
+    """
+    Return as JSON the cross-tab of the choices voted together in a given :model:`polls.Poll`, answering "people who
+    voted A also voted B".
+
+    :param request: HTTP request
+    :param pk: :model:`polls.Poll` instance primary-key
+    :return: JSON response {'voters': int, 'choices': [{'id', 'text'},], 'counts': [[int,],]}
+    """
+    poll = get_object_or_404(Poll, pk=pk)
+    report = poll.get_cooccurrence()
+    return JsonResponse({
+        'voters': report['voters'],
+        'choices': [{'id': choice_pk, 'text': text} for choice_pk, text in report['choices']],
+        'counts': report['counts'].tolist(),
+    })
+
+
+def ranked_results(request, pk):
+    """
+    Return as JSON the instant-runoff rounds and the Borda count of a ranked :model:`polls.Poll`.
+
+    :param request: HTTP request
+    :param pk: :model:`polls.Poll` instance primary-key
+    :return: JSON response {'ballots': int, 'choices': [{'id', 'text', 'borda'},], 'winner': choice pk or None,
+    'rounds': [{'counts': {choice pk: int}, 'eliminated': choice pk or None},]}
+    """
+    poll = get_object_or_404(Poll, pk=pk, ranked=True)
+    results = poll.get_ranked_results()
+    pks = [choice_pk for choice_pk, _ in results['choices']]
+    return JsonResponse({
+        'ballots': results['ballots'],
+        'choices': [{'id': choice_pk, 'text': text, 'borda': points}
+                    for (choice_pk, text), points in zip(results['choices'], results['borda'])],
+        'winner': None if results['winner'] is None else pks[results['winner']],
+        'rounds': [{'counts': dict(zip(pks, r['counts'])),
+                    'eliminated': None if r['eliminated'] is None else pks[r['eliminated']]}
+                   for r in results['rounds']],
+    })
+
+
 """ Forms used by each step of the :view:`polls.CreatePollWizard` """
 CREATE_FORMS = [('general', CreatePollGeneralForm),
                 ('choices', CreatePollChoicesForm),
@@ -166,6 +246,7 @@ class CreatePollWizard(LoginRequiredMixin, SessionWizardView):
             votes_max=poll_f['votes_max'],
             hidden_poll=poll_f['hidden_poll'],
             only_invited=poll_f['only_invited'],
+            ranked=poll_f['ranked'],
             pub_date=timezone.now(),
         )
         poll.save()
@@ -232,6 +313,7 @@ class EditPollWizard(CreatePollWizard):
             votes_max=poll_f['votes_max'],
             hidden_poll=poll_f['hidden_poll'],
             only_invited=poll_f['only_invited'],
+            ranked=poll_f['ranked'],
             pub_date=timezone.now(),
         )
 